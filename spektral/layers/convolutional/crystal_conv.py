@@ -92,6 +92,14 @@ class CrystalConv(MessagePassing):
         self.dense_f = Dense(channels, activation="sigmoid", **layer_kwargs)
         self.dense_s = Dense(channels, activation=self.activation, **layer_kwargs)
 
+        # The layers are built here rather than when they are first called, which
+        # may happen inside a compiled message function (see `jit_compile`)
+        input_dim = 2 * channels
+        if len(input_shape) == 3:
+            input_dim += input_shape[2][-1]
+        self.dense_f.build((None, input_dim))
+        self.dense_s.build((None, input_dim))
+
         self.built = True
 
     def message(self, x, e=None):
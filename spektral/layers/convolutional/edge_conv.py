@@ -1,3 +1,4 @@
+import tensorflow as tf
 from tensorflow.keras import activations
 from tensorflow.keras import backend as K
 from tensorflow.keras.layers import Dense
@@ -40,6 +41,14 @@ class EdgeConv(MessagePassing):
     - `mlp_hidden`: list of integers, number of hidden units for each hidden
     layer in the MLP (if None, the MLP has only the output layer);
     - `mlp_activation`: activation for the MLP layers;
+    - `mlp_dtype`: dtype policy for the layers of the MLP that are computed on the
+    edges (e.g., `"mixed_bfloat16"` or `"mixed_float16"`). The first layer of the
+    MLP, which is computed on the nodes, and the final activation always use the
+    dtype of the layer. If None, the whole MLP uses the dtype of the layer;
+    - `sort_edges`: bool, sort the edges by target so that sum and mean
+    aggregations are computed with sorted segment reductions. This is usually
+    faster on CPU for large graphs, but the sort is repeated at every training step
+    and it may be slower than the default unsorted reduction on GPU;
     - `activation`: activation function;
     - `use_bias`: bool, add a bias vector to the output;
     - `kernel_initializer`: initializer for the weights;
@@ -56,6 +65,8 @@ class EdgeConv(MessagePassing):
         channels,
         mlp_hidden=None,
         mlp_activation="relu",
+        mlp_dtype=None,
+        sort_edges=False,
         aggregate="sum",
         activation=None,
         use_bias=True,
@@ -84,9 +95,13 @@ class EdgeConv(MessagePassing):
         self.channels = channels
         self.mlp_hidden = mlp_hidden if mlp_hidden else []
         self.mlp_activation = activations.get(mlp_activation)
+        self.mlp_dtype = mlp_dtype
+        # Messages only depend on the node features, so the edges can be sorted
+        self.sort_edges = sort_edges
 
     def build(self, input_shape):
         assert len(input_shape) >= 2
+        input_dim = input_shape[0][-1]
         layer_kwargs = dict(
             kernel_initializer=self.kernel_initializer,
             bias_initializer=self.bias_initializer,
@@ -94,30 +109,59 @@ class EdgeConv(MessagePassing):
             bias_regularizer=self.bias_regularizer,
             kernel_constraint=self.kernel_constraint,
             bias_constraint=self.bias_constraint,
-            dtype=self.dtype,
+            dtype=self.mlp_dtype if self.mlp_dtype is not None else self.dtype,
         )
 
-        self.mlp = Sequential(
-            [
+        # The first layer of the MLP is computed on the nodes rather than on the
+        # edges (see message()), so it always uses the dtype of the layer and it is
+        # never called directly. It is kept in the Sequential model so that the
+        # weights have the same paths as in previous versions of the layer.
+        first_kwargs = dict(layer_kwargs, dtype=self.dtype)
+        if self.mlp_hidden:
+            first_layer = Dense(self.mlp_hidden[0], self.mlp_activation, **first_kwargs)
+            last_layers = [
                 Dense(channels, self.mlp_activation, **layer_kwargs)
-                for channels in self.mlp_hidden
-            ]
-            + [
-                Dense(
-                    self.channels,
-                    self.activation,
-                    use_bias=self.use_bias,
-                    **layer_kwargs
-                )
-            ]
-        )
+                for channels in self.mlp_hidden[1:]
+            ] + [Dense(self.channels, use_bias=self.use_bias, **layer_kwargs)]
+        else:
+            first_layer = Dense(
+                self.channels, self.activation, use_bias=self.use_bias, **first_kwargs
+            )
+            last_layers = []
+        # The layers are built here rather than when they are first called, which
+        # may happen inside a compiled message function (see `jit_compile`)
+        first_layer.build((None, 2 * input_dim))
+        input_dim = first_layer.units
+        for layer in last_layers:
+            layer.build((None, input_dim))
+            input_dim = layer.units
+        self.mlp = Sequential([first_layer] + last_layers)
 
         self.built = True
 
     def message(self, x, **kwargs):
-        x_i = self.get_targets(x)
-        x_j = self.get_sources(x)
-        return self.mlp(K.concatenate((x_i, x_j - x_i)))
+        # Splitting the kernel of the first layer as W = [W_1; W_2], we have that
+        # [x_i || x_j - x_i] W = x_i (W_1 - W_2) + x_j W_2, which we can compute
+        # on the nodes before gathering the targets and sources.
+        first_layer = self.mlp.layers[0]
+        input_dim = first_layer.kernel.shape[0] // 2
+        kernel_1 = first_layer.kernel[:input_dim]
+        kernel_2 = first_layer.kernel[input_dim:]
+        kernel = K.concatenate((kernel_1 - kernel_2, kernel_2))
+        h_i, h_j = tf.split(K.dot(x, kernel), 2, axis=-1)
+
+        output = self.get_targets(h_i) + self.get_sources(h_j)
+        if first_layer.use_bias:
+            output = K.bias_add(output, first_layer.bias)
+        output = first_layer.activation(output)
+        if len(self.mlp.layers) > 1:
+            for layer in self.mlp.layers[1:]:
+                output = layer(output)
+            # The output of the MLP is cast back in case it used a different dtype
+            output = tf.cast(output, x.dtype)
+            output = self.activation(output)
+
+        return output
 
     @property
     def config(self):
@@ -125,4 +169,6 @@ class EdgeConv(MessagePassing):
             "channels": self.channels,
             "mlp_hidden": self.mlp_hidden,
             "mlp_activation": self.mlp_activation,
+            "mlp_dtype": self.mlp_dtype,
+            "sort_edges": self.sort_edges,
         }
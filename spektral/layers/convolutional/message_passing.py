@@ -4,7 +4,12 @@ import tensorflow as tf
 from tensorflow.keras import backend as K
 from tensorflow.keras.layers import Layer
 
-from spektral.layers.ops.scatter import deserialize_scatter, serialize_scatter
+from spektral.layers.ops.scatter import (
+    SORTED_OP_DICT,
+    deserialize_scatter,
+    serialize_scatter,
+)
+from spektral.utils.adj_cache import get_edge_indices
 from spektral.utils.keras import (
     deserialize_kwarg,
     is_keras_kwarg,
@@ -12,6 +17,16 @@ from spektral.utils.keras import (
     serialize_kwarg,
 )
 
+version = tf.__version__.split(".")
+major, minor = int(version[0]), int(version[1])
+# The arguments of tf.function were renamed in TF 2.5 and 2.9
+if (major, minor) >= (2, 9):
+    _jit_kwargs = {"jit_compile": True, "reduce_retracing": True}
+elif (major, minor) >= (2, 5):
+    _jit_kwargs = {"jit_compile": True, "experimental_relax_shapes": True}
+else:
+    _jit_kwargs = {"experimental_compile": True, "experimental_relax_shapes": True}
+
 
 class MessagePassing(Layer):
     r"""
@@ -84,11 +99,27 @@ class MessagePassing(Layer):
     Supported aggregations: 'sum', 'mean', 'max', 'min', 'prod'.
     If callable, the function must have the signature `foo(updates, indices, n_nodes)`
     and return a rank 2 tensor with shape `(n_nodes, ...)`.
+    - `jit_compile`: bool, compile `message()` and `aggregate()` together with XLA,
+    so that the messages can be fused with their aggregation instead of being
+    materialized. XLA compiles the function again for every new number of nodes
+    and edges (e.g., for every batch in disjoint mode), so this is only worth it
+    when the same graph sizes are seen many times. Not supported by layers that
+    use ops that XLA cannot compile (e.g., `XENetConv`).
     - `kwargs`: additional keyword arguments specific to Keras' Layers, like
     regularizers, initializers, constraints, etc.
     """
 
-    def __init__(self, aggregate="sum", **kwargs):
+    # If True, propagate() sorts the edges by target (and permutes the edge
+    # attributes accordingly), so that sums and averages can be computed with
+    # sorted segment reductions. Only set this in layers whose messages do not
+    # depend on the order of the edges in `a` (e.g., by using `a.values`).
+    sort_edges = False
+
+    # Set this to False in layers whose message() or aggregate() use ops that XLA
+    # cannot compile, so that jit_compile=True is rejected.
+    supports_jit_compile = True
+
+    def __init__(self, aggregate="sum", jit_compile=False, **kwargs):
         super().__init__(**{k: v for k, v in kwargs.items() if is_keras_kwarg(k)})
         self.kwargs_keys = []
         for key in kwargs:
@@ -102,6 +133,15 @@ class MessagePassing(Layer):
         self.agg_signature = inspect.signature(self.aggregate).parameters
         self.upd_signature = inspect.signature(self.update).parameters
         self.agg = deserialize_scatter(aggregate)
+        self.jit_compile = jit_compile
+        if self.jit_compile and not self.supports_jit_compile:
+            raise ValueError(
+                "{} does not support jit_compile=True.".format(type(self).__name__)
+            )
+        if self.jit_compile:
+            self._jit_message_and_aggregate = tf.function(
+                self._message_and_aggregate, **_jit_kwargs
+            )
 
     def call(self, inputs, **kwargs):
         x, a, e = self.get_inputs(inputs)
@@ -112,16 +152,28 @@ class MessagePassing(Layer):
 
     def propagate(self, x, a, e=None, **kwargs):
         self.n_nodes = tf.shape(x)[-2]
-        self.index_targets = a.indices[:, 1]  # Nodes receiving the message
-        self.index_sources = a.indices[:, 0]  # Nodes sending the message (ie neighbors)
-
-        # Message
+        # Nodes receiving the message, and nodes sending the message (ie neighbors)
+        self.index_targets, self.index_sources, permutation = get_edge_indices(
+            a, sort=self._sorted_aggregation()
+        )
+        if permutation is not None and e is not None:
+            e = tf.gather(e, permutation, axis=-2)
+
+        # Message and aggregate
         msg_kwargs = self.get_kwargs(x, a, e, self.msg_signature, kwargs)
-        messages = self.message(x, **msg_kwargs)
-
-        # Aggregate
         agg_kwargs = self.get_kwargs(x, a, e, self.agg_signature, kwargs)
-        embeddings = self.aggregate(messages, **agg_kwargs)
+        if self.jit_compile:
+            embeddings = self._jit_message_and_aggregate(
+                x,
+                self.index_targets,
+                self.index_sources,
+                self.n_nodes,
+                msg_kwargs,
+                agg_kwargs,
+            )
+        else:
+            messages = self.message(x, **msg_kwargs)
+            embeddings = self.aggregate(messages, **agg_kwargs)
 
         # Update
         upd_kwargs = self.get_kwargs(x, a, e, self.upd_signature, kwargs)
@@ -129,10 +181,33 @@ class MessagePassing(Layer):
 
         return output
 
+    def _message_and_aggregate(
+        self, x, index_targets, index_sources, n_nodes, msg_kwargs, agg_kwargs
+    ):
+        # The indices are given as inputs so that the compiled function never reuses
+        # the tensors captured when it was traced. They are exposed as attributes
+        # only while tracing, as expected by message() and aggregate().
+        outer_attributes = (self.index_targets, self.index_sources, self.n_nodes)
+        self.index_targets, self.index_sources = index_targets, index_sources
+        self.n_nodes = n_nodes
+        try:
+            messages = self.message(x, **msg_kwargs)
+            return self.aggregate(messages, **agg_kwargs)
+        finally:
+            self.index_targets, self.index_sources, self.n_nodes = outer_attributes
+
     def message(self, x, **kwargs):
         return self.get_sources(x)
 
+    def _sorted_aggregation(self):
+        # Edges are only sorted if the aggregation has a sorted implementation.
+        # Sorted segment reductions have a data-dependent output shape, which XLA
+        # does not support.
+        return self.sort_edges and not self.jit_compile and self.agg in SORTED_OP_DICT
+
     def aggregate(self, messages, **kwargs):
+        if self._sorted_aggregation():
+            return SORTED_OP_DICT[self.agg](messages, self.index_targets, self.n_nodes)
         return self.agg(messages, self.index_targets, self.n_nodes)
 
     def update(self, embeddings, **kwargs):
@@ -186,7 +261,10 @@ class MessagePassing(Layer):
         return x, a, e
 
     def get_config(self):
-        mp_config = {"aggregate": serialize_scatter(self.agg)}
+        mp_config = {
+            "aggregate": serialize_scatter(self.agg),
+            "jit_compile": self.jit_compile,
+        }
         keras_config = {}
         for key in self.kwargs_keys:
             keras_config[key] = serialize_kwarg(key, getattr(self, key))
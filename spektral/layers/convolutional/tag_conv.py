@@ -1,8 +1,17 @@
+import functools
+
+import numpy as np
+import scipy.sparse as sp
+import tensorflow as tf
 from tensorflow.keras import backend as K
 from tensorflow.keras.layers import Dense
+from tensorflow.python.ops.linalg.sparse import sparse as tfsp
 
+from spektral.layers import ops
 from spektral.layers.convolutional.message_passing import MessagePassing
-from spektral.utils import normalized_adjacency
+from spektral.layers.ops.scatter import scatter_mean, scatter_sum
+from spektral.utils import normalized_adjacency, sp_matrix_to_sp_tensor
+from spektral.utils.adj_cache import cached
 
 
 class TAGConv(MessagePassing):
@@ -21,6 +30,13 @@ class TAGConv(MessagePassing):
         \Z = \sum\limits_{k=0}^{K} \D^{-1/2}\A^k\D^{-1/2}\X\W^{(k)}
     $$
 
+    Note that previous versions of this layer propagated the node features by a
+    single hop at every step (i.e., \(\A\X\) instead of \(\A^k\X\)), so
+    their outputs differ from those of this version for K > 1.
+
+    If the layer is always called on the same graph, the powers of the adjacency
+    matrix can be precomputed with `cache_powers(a)`.
+
     **Input**
 
     - Node features of shape `(n_nodes, n_node_features)`;
@@ -36,6 +52,9 @@ class TAGConv(MessagePassing):
     - `channels`: integer, number of output channels;
     - `K`: the order of the layer (i.e., the layer will consider a K-hop
     neighbourhood for each node);
+    - `jit_compile`: bool, compile the message passing with XLA. This only has an
+    effect with `aggregate="max"`, `"min"`, or `"prod"`, because sum and mean
+    aggregations are computed with sparse matmuls instead of message passing;
     - `activation`: activation function;
     - `use_bias`: bool, add a bias vector to the output;
     - `kernel_initializer`: initializer for the weights;
@@ -78,33 +97,176 @@ class TAGConv(MessagePassing):
         )
         self.channels = channels
         self.K = K
-        self.linear = Dense(
-            channels,
-            activation=activation,
-            use_bias=use_bias,
-            kernel_initializer=kernel_initializer,
-            bias_initializer=bias_initializer,
-            kernel_regularizer=kernel_regularizer,
-            bias_regularizer=bias_regularizer,
-            activity_regularizer=activity_regularizer,
-            kernel_constraint=kernel_constraint,
-            bias_constraint=bias_constraint,
-        )
+        self._powers = None
 
     def build(self, input_shape):
         assert len(input_shape) >= 2
+        input_dim = input_shape[0][-1]
+        # The weights are stored in a dense layer applied to the concatenation of
+        # the K + 1 hops, with kernel [W_0; W_1; ...; W_K], as in previous versions
+        # of the layer. The dense layer itself is never called.
+        self.linear = Dense(
+            self.channels,
+            use_bias=self.use_bias,
+            kernel_initializer=self.kernel_initializer,
+            bias_initializer=self.bias_initializer,
+            kernel_regularizer=self.kernel_regularizer,
+            bias_regularizer=self.bias_regularizer,
+            kernel_constraint=self.kernel_constraint,
+            bias_constraint=self.bias_constraint,
+            dtype=self._dtype_policy,
+        )
+        self.linear.build((None, (self.K + 1) * input_dim))
         self.built = True
 
     def call(self, inputs, **kwargs):
         x, a, _ = self.get_inputs(inputs)
-        edge_weight = a.values
+        input_dim = x.shape[-1]
 
-        output = [x]
-        for _ in range(self.K):
-            output.append(self.propagate(x, a, edge_weight=edge_weight))
-        output = K.concatenate(output)
+        linear = self.agg is scatter_sum or self.agg is scatter_mean
+        project_first = linear and input_dim is not None and self.channels < input_dim
+
+        if self._powers is not None:
+            output = self._propagate_powers(x, project_first)
+        else:
+            output = self._propagate_hops(x, a, linear, project_first)
+
+        if self.use_bias:
+            output = K.bias_add(output, self.bias)
+        output = self.activation(output)
+
+        return output
+
+    def _propagate_hops(self, x, a, linear, project_first):
+        if linear:
+            # The propagation matrix is converted to CSR only once, and shared by
+            # all hops and all layers that are called on the same matrix
+            mean = self.agg is scatter_mean
+            propagate_hop = cached(
+                a,
+                "tag_conv_mean" if mean else "tag_conv_sum",
+                lambda: _propagation_matmul_fn(a, mean),
+                use_values=True,
+            )
+        else:
+            propagate_hop = functools.partial(self.propagate, a=a, edge_weight=a.values)
 
-        return self.linear(output)
+        if project_first:
+            # The propagation is linear, so we can project the node features to the
+            # smaller output space first and then propagate with Horner's scheme:
+            # sum_k A^k X W_k = X W_0 + A (X W_1 + A (X W_2 + ...))
+            projections = self._project(x)
+            output = projections[self.K]
+            for k in range(self.K - 1, -1, -1):
+                output = propagate_hop(output) + projections[k]
+        else:
+            # Each hop is projected as soon as it is computed, so that the hops
+            # never need to be concatenated in a (n_nodes, (K + 1) * F) buffer
+            h = x
+            output = K.dot(h, self._hop_kernel(0))
+            for k in range(1, self.K + 1):
+                h = propagate_hop(h)
+                output += K.dot(h, self._hop_kernel(k))
+
+        return output
+
+    def _propagate_powers(self, x, project_first):
+        n_nodes = self._powers[0][0].shape[0]
+        if x.shape[-2] is not None and x.shape[-2] != n_nodes:
+            raise ValueError(
+                "The powers were cached for a graph with {} nodes, but the layer "
+                "was called on a graph with {} nodes. Call cache_powers(None) to "
+                "use the input adjacency matrix.".format(n_nodes, x.shape[-2])
+            )
+
+        # With the powers of the propagation matrix already computed, the hops do
+        # not depend on each other and the matmuls can run in parallel.
+        # The CSR matrices are only reused in eager mode: traced functions convert
+        # the powers themselves, since they cannot capture eager CSR matrices and
+        # still be exported as SavedModels.
+        if tf.executing_eagerly():
+            powers = [_csr_matmul_fn(*power) for power in self._powers]
+        else:
+            powers = [_csr_matmul_fn(power) for power, _ in self._powers]
+        if project_first:
+            projections = self._project(x)
+            output = projections[0]
+            for k in range(1, self.K + 1):
+                output += powers[k - 1](projections[k])
+        else:
+            output = K.dot(x, self._hop_kernel(0))
+            for k in range(1, self.K + 1):
+                output += K.dot(powers[k - 1](x), self._hop_kernel(k))
+
+        return output
+
+    @property
+    def kernel(self):
+        return self.linear.kernel
+
+    @property
+    def bias(self):
+        return self.linear.bias
+
+    def _hop_kernel(self, k):
+        # Returns W_k, the block of the kernel that projects the k-th hop
+        input_dim = self.kernel.shape[0] // (self.K + 1)
+        return self.kernel[k * input_dim : (k + 1) * input_dim]
+
+    def _project(self, x):
+        # Computes [X W_0, ..., X W_K] with a single matmul
+        input_dim = self.kernel.shape[0] // (self.K + 1)
+        kernel = tf.reshape(self.kernel, (self.K + 1, input_dim, self.channels))
+        kernel = tf.reshape(tf.transpose(kernel, (1, 0, 2)), (input_dim, -1))
+        return tf.split(K.dot(x, kernel), self.K + 1, axis=-1)
+
+    def cache_powers(self, a=None):
+        """
+        Precomputes the first K powers of the propagation matrix for a static graph,
+        so that the hops of the layer become independent sparse-dense matmuls.
+        Once the powers are cached, the layer ignores the adjacency matrix that it
+        receives as input, so this should only be used if the layer is always
+        called on the same graph (e.g., for transductive learning or inference).
+        The cache is not part of the config or of the weights of the layer, so it is
+        lost when the layer is rebuilt from its config. Functions traced while the
+        powers are cached (including those exported in a SavedModel) embed the
+        powers as constants.
+        The cache is read when the layer is traced, so functions that were already
+        traced are not affected by this method. For instance, a Keras model that
+        was already trained or evaluated must be compiled again with
+        `model.compile()`.
+
+        :param a: Scipy sparse matrix of shape `(n_nodes, n_nodes)`, the
+        preprocessed adjacency matrix of the graph. If None, the cached powers are
+        removed and the layer goes back to using its input adjacency matrix.
+        """
+        if a is None:
+            self._powers = None
+            return
+        if self.agg is not scatter_sum and self.agg is not scatter_mean:
+            raise ValueError(
+                "Powers can only be cached with aggregate='sum' or aggregate='mean'."
+            )
+
+        # Messages are sent from the rows to the columns of the adjacency matrix
+        p = sp.csr_matrix(a, dtype=self.dtype).T.tocsr()
+        if self.agg is scatter_mean:
+            # Edges with an explicit zero weight still count as messages
+            n_messages = np.diff(p.indptr)
+            p = sp.diags(1 / np.maximum(n_messages, 1)).astype(p.dtype) @ p
+        p.eliminate_zeros()
+
+        powers = []
+        p_k = p
+        for _ in range(self.K):
+            # Scipy may upcast half precision matrices
+            p_k_tensor = tf.cast(sp_matrix_to_sp_tensor(p_k), self._compute_dtype)
+            if p_k_tensor.dtype in _CSR_DTYPES:
+                powers.append((p_k_tensor, tfsp.CSRSparseMatrix(p_k_tensor)))
+            else:
+                powers.append((p_k_tensor, None))
+            p_k = p_k @ p
+        self._powers = powers
 
     def message(self, x, edge_weight=None):
         x_j = self.get_sources(x)
@@ -114,8 +276,85 @@ class TAGConv(MessagePassing):
     def config(self):
         return {
             "channels": self.channels,
+            "K": self.K,
         }
 
     @staticmethod
     def preprocess(a):
         return normalized_adjacency(a)
+
+
+_CSR_DTYPES = (tf.float32, tf.float64)
+
+
+def _propagation_matmul_fn(a, mean=False):
+    """
+    Returns a function that sums (or averages, if `mean=True`) the messages sent
+    along the edges of `a`, weighted by the values of `a`.
+    :param a: SparseTensor of rank 2.
+    :param mean: bool, whether to average the messages rather than summing them.
+    :return: a function that takes a Tensor `x` and returns a Tensor.
+    """
+    # Summing the weighted messages sent along the edges is equivalent to
+    # multiplying by A^T. Averaging is the same, after dividing each row of A^T
+    # by the number of messages received by the node.
+    a = ops.transpose(a)
+    if mean:
+        targets = a.indices[:, 0]
+        n_messages = tf.math.unsorted_segment_sum(
+            tf.ones_like(a.values), targets, a.dense_shape[0]
+        )
+        a = tf.SparseTensor(
+            a.indices, a.values / tf.gather(n_messages, targets), a.dense_shape
+        )
+
+    return _csr_matmul_fn(a)
+
+
+def _csr_matmul_fn(a, a_csr=None):
+    """
+    Converts a SparseTensor to CSR format once, and returns a function that computes
+    `a @ x` for node features `x` of rank 2 or 3 (mixed mode).
+    Gradients are propagated to both `x` and the values of `a`.
+    CSR matrices only support single and double precision, so for other dtypes
+    the function falls back to gathering and summing the weighted messages.
+    :param a: SparseTensor of rank 2.
+    :param a_csr: the CSR representation of `a`, if it was already computed.
+    :return: a function that takes a Tensor `x` and returns a Tensor.
+    """
+    if a.dtype not in _CSR_DTYPES:
+
+        def scatter_matmul(x):
+            messages = a.values[:, None] * tf.gather(x, a.indices[:, 1], axis=-2)
+            return scatter_sum(messages, a.indices[:, 0], a.dense_shape[0])
+
+        return scatter_matmul
+    a_const = tf.SparseTensor(a.indices, tf.stop_gradient(a.values), a.dense_shape)
+    if a_csr is None:
+        a_csr = tfsp.CSRSparseMatrix(a_const)
+
+    @tf.custom_gradient
+    def _matmul(values, x):
+        def grad(upstream):
+            grad_values = tf.reduce_sum(
+                tf.gather(upstream, a.indices[:, 0]) * tf.gather(x, a.indices[:, 1]),
+                axis=-1,
+            )
+            # The gradient must not capture the CSR matrix, otherwise the function
+            # cannot be exported as a SavedModel
+            grad_x = tf.sparse.sparse_dense_matmul(a_const, upstream, adjoint_a=True)
+            return grad_values, grad_x
+
+        return tfsp.matmul(a_csr, x), grad
+
+    def matmul(x):
+        if K.ndim(x) == 3:
+            # Mixed mode: stack the batch along the feature dimension
+            x_shape = tf.shape(x)
+            x = tf.reshape(tf.transpose(x, (1, 2, 0)), (x_shape[1], -1))
+            output = _matmul(a.values, x)
+            output = tf.reshape(output, (x_shape[1], x_shape[2], x_shape[0]))
+            return tf.transpose(output, (2, 0, 1))
+        return _matmul(a.values, x)
+
+    return matmul
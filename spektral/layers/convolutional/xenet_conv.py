@@ -62,6 +62,9 @@ class XENetConv(MessagePassing):
     - `bias_constraint`: constraint applied to the bias vector.
     """
 
+    # sparse_reorder in message() cannot be compiled with XLA
+    supports_jit_compile = False
+
     def __init__(
         self,
         stack_channels,
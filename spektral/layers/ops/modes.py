@@ -70,6 +70,32 @@ def disjoint_adjacency_to_batch(A, I):
     return batch
 
 
+def list_to_disjoint(x_list, a_list):
+    """
+    Converts lists of node features and adjacency matrices to disjoint mode,
+    by stacking the node features and building a block-diagonal adjacency matrix.
+    This is the same as `spektral.data.utils.to_disjoint`, but for Tensors.
+
+    :param x_list: list of Tensors, node features of shape `(n_nodes, n_node_features)`
+    (`n_nodes` can change between graphs);
+    :param a_list: list of SparseTensors, adjacency matrices of shape
+    `(n_nodes, n_nodes)`;
+    :return:
+        - `x`: Tensor, node features of shape `(n_nodes, n_node_features)`;
+        - `a`: SparseTensor, adjacency matrix of shape `(n_nodes, n_nodes)`;
+        - `i`: Tensor, graph IDs of shape `(n_nodes, )`;
+    """
+    n_nodes = tf.stack([tf.shape(x, out_type=tf.int64)[0] for x in x_list])
+    offsets = tf.cumsum(n_nodes, exclusive=True)
+    indices = tf.concat([a.indices + offsets[i] for i, a in enumerate(a_list)], 0)
+    values = tf.concat([a.values for a in a_list], 0)
+    n_nodes_total = tf.reduce_sum(n_nodes)
+    a = tf.SparseTensor(indices, values, tf.stack([n_nodes_total, n_nodes_total]))
+    i = tf.repeat(tf.range(len(x_list), dtype=tf.int64), n_nodes)
+
+    return tf.concat(x_list, 0), a, i
+
+
 def autodetect_mode(x, a):
     """
     Returns a code that identifies the data mode from the given node features
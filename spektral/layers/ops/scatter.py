@@ -172,6 +172,48 @@ def scatter_prod(messages, indices, n_nodes):
     return tf.math.unsorted_segment_prod(messages, indices, n_nodes)
 
 
+def _pad_segments(segments, n_nodes):
+    # Pads the output of a sorted segment reduction, which only has as many rows
+    # as the largest index plus one, with zeros up to n_nodes
+    n_missing = tf.cast(n_nodes, tf.int32) - tf.shape(segments)[0]
+    paddings = [[0, n_missing]] + [[0, 0]] * (segments.shape.rank - 1)
+    output = tf.pad(segments, paddings)
+    output.set_shape([None] + segments.shape[1:])
+    return output
+
+
+@mixed_mode_support
+def sorted_scatter_sum(messages, indices, n_nodes):
+    """
+    Equivalent to `scatter_sum`, but requires `indices` to be sorted in ascending
+    order and non-negative. Summing sorted segments is considerably faster than
+    summing unsorted ones.
+
+    :param messages: a 2D or 3D Tensor.
+    :param indices: A 1D Tensor with sorted indices into the "nodes" dimension of
+    the messages.
+    :param n_nodes: dimension of the output along the "nodes" dimension.
+    :return: a Tensor with the same rank as `messages`.
+    """
+    return _pad_segments(tf.math.segment_sum(messages, indices), n_nodes)
+
+
+@mixed_mode_support
+def sorted_scatter_mean(messages, indices, n_nodes):
+    """
+    Equivalent to `scatter_mean`, but requires `indices` to be sorted in ascending
+    order and non-negative. Averaging sorted segments is considerably faster than
+    averaging unsorted ones.
+
+    :param messages: a 2D or 3D Tensor.
+    :param indices: A 1D Tensor with sorted indices into the "nodes" dimension of
+    the messages.
+    :param n_nodes: dimension of the output along the "nodes" dimension.
+    :return: a Tensor with the same rank as `messages`.
+    """
+    return _pad_segments(tf.math.segment_mean(messages, indices), n_nodes)
+
+
 OP_DICT = {
     "sum": scatter_sum,
     "mean": scatter_mean,
@@ -180,6 +222,11 @@ OP_DICT = {
     "prod": scatter_prod,
 }
 
+SORTED_OP_DICT = {
+    scatter_sum: sorted_scatter_sum,
+    scatter_mean: sorted_scatter_mean,
+}
+
 
 def unsorted_segment_softmax(x, indices, n_nodes=None):
     """
@@ -0,0 +1,89 @@
+import weakref
+
+import tensorflow as tf
+
+try:
+    from tensorflow.python.eager.record import could_possibly_record
+except ImportError:
+    # TF < 2.12
+    from tensorflow.python.eager.tape import could_possibly_record
+
+# Quantities derived from the adjacency matrices given to the layers (e.g., the
+# edge indices sorted by target, or CSR representations), shared by all layers
+# that are called on the same matrix.
+# In eager mode, entries are removed when the tensors that they were derived from
+# are garbage-collected. In graph mode, the cache is stored on the graph in which
+# the quantities were computed, so that it never outlives the graph.
+_eager_cache = {}
+
+
+def _get_cache():
+    if tf.executing_eagerly():
+        return _eager_cache
+    graph = tf.compat.v1.get_default_graph()
+    cache = getattr(graph, "_spektral_adj_cache", None)
+    if cache is None:
+        cache = {}
+        graph._spektral_adj_cache = cache
+
+    return cache
+
+
+def cached(a, name, compute, use_values=False):
+    """
+    Returns the quantity called `name` derived from the adjacency matrix `a`,
+    computing it with `compute()` only the first time that it is requested for `a`
+    (in the current graph).
+    Quantities are keyed on the identity of `a.indices`, and also on the identity
+    of `a.values` if `use_values=True`. In eager mode, quantities that depend on the
+    values are not cached while a GradientTape is recording, so that gradients can
+    flow to the values.
+    :param a: SparseTensor of rank 2.
+    :param name: string, the name of the quantity.
+    :param compute: callable without arguments that computes the quantity.
+    :param use_values: bool, whether the quantity depends on the values of `a`.
+    :return: the cached quantity.
+    """
+    tensors = (a.indices, a.values) if use_values else (a.indices,)
+    if use_values and tf.executing_eagerly() and could_possibly_record():
+        return compute()
+
+    cache = _get_cache()
+    key = (name,) + tuple(id(t) for t in tensors)
+    entry = cache.get(key)
+    if entry is not None and all(ref() is t for ref, t in zip(entry[0], tensors)):
+        return entry[1]
+
+    refs = tuple(weakref.ref(t, lambda _: cache.pop(key, None)) for t in tensors)
+    value = compute()
+    cache[key] = (refs, value)
+
+    return value
+
+
+def get_edge_indices(a, sort=False):
+    """
+    Returns the target and source indices of the edges in `a`, and the permutation
+    that sorts the edges by target if `sort=True` (otherwise, None is returned for
+    the permutation and the edges keep the same order as in `a`).
+    Messages are sent from the rows (sources) to the columns (targets) of `a`.
+    :param a: SparseTensor of rank 2.
+    :param sort: bool, whether to sort the edges by target.
+    :return: the target indices, the source indices, and the permutation.
+    """
+    if not sort:
+        targets, sources = cached(
+            a, "edge_indices", lambda: (a.indices[:, 1], a.indices[:, 0])
+        )
+        return targets, sources, None
+
+    def sort_edges():
+        targets, sources, _ = get_edge_indices(a)
+        permutation = tf.argsort(targets, stable=True)
+        return (
+            tf.gather(targets, permutation),
+            tf.gather(sources, permutation),
+            permutation,
+        )
+
+    return cached(a, "sorted_edge_indices", sort_edges)
@@ -16,3 +16,6 @@ def test_layer():
     run_layer(config)
     config["kwargs"]["trainable"] = False
     run_layer(config)
+    config["kwargs"]["jit_compile"] = True
+    run_layer(config)
+    config["kwargs"].pop("jit_compile")
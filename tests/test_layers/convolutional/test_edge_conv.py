@@ -1,6 +1,11 @@
-from core import MODES, run_layer
+import itertools
+
+import numpy as np
+import scipy.sparse as sp
+from core import MODES, X, run_layer
 
 from spektral import layers
+from spektral.utils.sparse import sp_matrix_to_sp_tensor
 
 config = {
     "layer": layers.EdgeConv,
@@ -14,3 +19,34 @@ config = {
 
 def test_layer():
     run_layer(config)
+    config["kwargs"]["mlp_hidden"] = None
+    run_layer(config)
+    config["kwargs"]["mlp_hidden"] = [16]
+    config["kwargs"]["mlp_dtype"] = "mixed_bfloat16"
+    run_layer(config)
+    config["kwargs"].pop("mlp_dtype")
+    config["kwargs"]["jit_compile"] = True
+    run_layer(config)
+    config["kwargs"].pop("jit_compile")
+    config["kwargs"]["sort_edges"] = True
+    run_layer(config)
+    config["kwargs"].pop("sort_edges")
+
+
+def test_output():
+    # Compare against the sum of MLP([x_i || x_j - x_i]) over the edges j -> i
+    a = sp.random(X.shape[0], X.shape[0], density=0.5, format="coo", random_state=0)
+    relu = lambda h: np.maximum(h, 0)
+    for mlp_hidden, sort_edges in itertools.product([None, [16, 8]], [False, True]):
+        layer = layers.EdgeConv(
+            4, mlp_hidden=mlp_hidden, sort_edges=sort_edges, activation="relu"
+        )
+        output = layer([X, sp_matrix_to_sp_tensor(a)])
+        weights = layer.get_weights()
+
+        h = np.concatenate([X[a.col], X[a.row] - X[a.col]], axis=-1)
+        for i in range(0, len(weights), 2):
+            h = relu(h @ weights[i] + weights[i + 1])
+        expected = np.zeros((X.shape[0], 4))
+        np.add.at(expected, a.col, h)
+        assert np.allclose(output, expected)
@@ -16,3 +16,6 @@ def test_layer():
     run_layer(config)
     config["kwargs"]["epsilon"] = 0.0
     run_layer(config)
+    config["kwargs"]["jit_compile"] = True
+    run_layer(config)
+    config["kwargs"].pop("jit_compile")
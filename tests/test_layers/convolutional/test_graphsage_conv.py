@@ -14,3 +14,6 @@ config = {
 
 def test_layer():
     run_layer(config)
+    config["kwargs"]["jit_compile"] = True
+    run_layer(config)
+    config["kwargs"].pop("jit_compile")
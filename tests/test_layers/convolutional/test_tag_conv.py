@@ -1,6 +1,12 @@
-from core import MODES, run_layer
+import numpy as np
+import pytest
+import scipy.sparse as sp
+import tensorflow as tf
+from core import MODES, A, F, X, run_layer
+from tensorflow.keras import Input, Model
 
 from spektral import layers
+from spektral.utils.sparse import sp_matrix_to_sp_tensor
 
 config = {
     "layer": layers.TAGConv,
@@ -14,3 +20,76 @@ config = {
 
 def test_layer():
     run_layer(config)
+    config["kwargs"]["aggregate"] = "max"
+    config["kwargs"]["jit_compile"] = True
+    run_layer(config)
+    config["kwargs"].pop("aggregate")
+    config["kwargs"].pop("jit_compile")
+
+
+def test_output():
+    # Compare against sum_k (A^T)^k X W_k + b, with A^T row-normalized for mean
+    a = sp.random(X.shape[0], X.shape[0], density=0.5, format="csr", random_state=0)
+    a_t = a.T.toarray()
+    for aggregate in ["sum", "mean"]:
+        p = a_t
+        if aggregate == "mean":
+            p = a_t / np.maximum((a_t != 0).sum(-1, keepdims=True), 1)
+        for channels in [3, 11]:
+            layer = layers.TAGConv(channels, K=3, aggregate=aggregate)
+            output = layer([X, sp_matrix_to_sp_tensor(a)])
+            kernel, bias = layer.get_weights()
+            kernels = np.split(kernel, layer.K + 1)
+            expected = bias + sum(
+                np.linalg.matrix_power(p, k) @ X @ kernels[k]
+                for k in range(layer.K + 1)
+            )
+            assert np.allclose(output, expected)
+
+
+def test_cache_powers():
+    # One edge is stored with an explicit zero weight, which still counts as a
+    # message for the mean aggregation
+    a = layers.TAGConv.preprocess(sp.csr_matrix(A)).tocoo()
+    a.data[1] = 0
+    a_tensor = tf.sparse.reorder(
+        tf.SparseTensor(np.stack([a.row, a.col], -1), a.data, a.shape)
+    )
+    inputs = [X, a_tensor]
+    for aggregate in ["sum", "mean"]:
+        for channels in [3, 11]:
+            layer = layers.TAGConv(channels, K=3, aggregate=aggregate)
+            output = layer(inputs)
+            layer.cache_powers(a)
+            output_cached = layer(inputs)
+            assert np.allclose(output, output_cached)
+
+    with pytest.raises(ValueError):
+        layer([X[:5], inputs[1]])
+
+
+def test_half_precision():
+    a = sp_matrix_to_sp_tensor(layers.TAGConv.preprocess(sp.csr_matrix(A)))
+    for aggregate in ["sum", "mean"]:
+        for channels in [3, 11]:
+            layer = layers.TAGConv(channels, aggregate=aggregate, dtype="float16")
+            assert layer([X, a]).dtype == "float16"
+
+
+def test_save_load(tmp_path):
+    a = sp_matrix_to_sp_tensor(layers.TAGConv.preprocess(sp.csr_matrix(A)))
+    for aggregate in ["sum", "mean"]:
+        for cache_powers in [False, True]:
+            x_in = Input(shape=(F,))
+            a_in = Input(shape=(None,), sparse=True)
+            layer = layers.TAGConv(3, aggregate=aggregate)
+            model = Model([x_in, a_in], layer([x_in, a_in]))
+            if cache_powers:
+                layer.cache_powers(layers.TAGConv.preprocess(sp.csr_matrix(A)))
+
+            path = str(tmp_path / "{}_{}".format(aggregate, cache_powers))
+            model.save(path, save_format="tf")
+            model_loaded = tf.keras.models.load_model(
+                path, custom_objects={"TAGConv": layers.TAGConv}
+            )
+            assert np.allclose(model([X, a]), model_loaded([X, a]))
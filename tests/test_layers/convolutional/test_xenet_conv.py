@@ -1,4 +1,5 @@
 import numpy as np
+import pytest
 from tensorflow.keras.layers import Input
 from tensorflow.keras.models import Model
 
@@ -190,6 +191,11 @@ def test_dense_model_unknown_size():
     # total = t+x+e+p       = 1292
 
 
+def test_jit_compile():
+    with pytest.raises(ValueError):
+        XENetConv(5, 10, 20, jit_compile=True)
+
+
 if __name__ == "__main__":
     test_sparse_model_sizes()
     test_dense_model_sizes()
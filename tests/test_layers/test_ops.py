@@ -283,6 +283,12 @@ def test_modes_ops():
     assert expected_a.shape == result.shape
     assert np.allclose(expected_a, result, atol=tol)
 
+    # List to disjoint
+    result = ops.list_to_disjoint(x_list, [sp_matrix_to_sp_tensor(a) for a in a_list])
+    assert np.allclose(result[0], x, atol=tol)
+    assert np.allclose(tf.sparse.to_dense(result[1]), tf.sparse.to_dense(a), atol=tol)
+    assert np.array_equal(result[2], i)
+
 
 def test_scatter_ops():
     from spektral.layers.ops.scatter import OP_DICT
@@ -345,6 +351,24 @@ def test_scatter_ops():
             )
 
 
+def test_sorted_scatter_ops():
+    from spektral.layers.ops.scatter import SORTED_OP_DICT
+
+    indices = np.array([0, 1, 1, 2, 2, 2, 4, 4, 4, 4])
+    n_nodes = 7
+    messages = np.random.rand(len(indices), 10)
+    messages_mixed = np.random.rand(3, len(indices), 10)
+
+    for scatter_fn, sorted_scatter_fn in SORTED_OP_DICT.items():
+        out = sorted_scatter_fn(messages, indices, n_nodes)
+        assert out.shape == (n_nodes, 10)
+        assert np.allclose(out, scatter_fn(messages, indices, n_nodes), atol=tol)
+
+        out = sorted_scatter_fn(messages_mixed, indices, n_nodes)
+        assert out.shape == (3, n_nodes, 10)
+        assert np.allclose(out, scatter_fn(messages_mixed, indices, n_nodes), atol=tol)
+
+
 def test_segment_top_k():
     x = np.array([0.2, 0.5, 0.3, -0.1, -0.2, -0.1], dtype=np.float32)
     I = np.array([0, 0, 0, 0, 1, 1], dtype=np.int64)
@@ -0,0 +1,41 @@
+import numpy as np
+import tensorflow as tf
+
+from spektral.utils.adj_cache import cached, get_edge_indices
+
+
+def test_cached():
+    a = tf.sparse.from_dense(np.array([[0, 1, 1], [1, 0, 0], [1, 0, 0]], "f4"))
+    calls = []
+
+    def compute():
+        calls.append(None)
+        return a.values * 2
+
+    assert cached(a, "test", compute) is cached(a, "test", compute)
+    assert len(calls) == 1
+
+    b = tf.sparse.from_dense(np.ones((3, 3), "f4"))
+    cached(b, "test", compute)
+    assert len(calls) == 2
+
+    # Quantities that depend on the values are recomputed if only the values change
+    c = tf.SparseTensor(a.indices, a.values * 5, a.dense_shape)
+    cached(a, "test_values", compute, use_values=True)
+    cached(a, "test_values", compute, use_values=True)
+    cached(c, "test_values", compute, use_values=True)
+    cached(c, "test", compute)
+    assert len(calls) == 4
+
+
+def test_get_edge_indices():
+    a = tf.sparse.from_dense(np.array([[0, 1, 1], [1, 0, 0], [1, 0, 0]], "f4"))
+    targets, sources, permutation = get_edge_indices(a)
+    assert np.array_equal(targets, [1, 2, 0, 0])
+    assert np.array_equal(sources, [0, 0, 1, 2])
+    assert permutation is None
+
+    targets, sources, permutation = get_edge_indices(a, sort=True)
+    assert np.array_equal(targets, [0, 0, 1, 2])
+    assert np.array_equal(sources, [1, 2, 0, 0])
+    assert np.array_equal(permutation, [2, 3, 0, 1])